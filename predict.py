@@ -1,25 +1,155 @@
-from prophet import Prophet
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
+import numpy as np
 import pandas as pd
 import streamlit as st  # Import Streamlit here
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
+WEEKLY_FREQ = 'W-FRI'
+FITTED_MODEL_CACHE_SIZE = 32
 
-def get_forecast(ticker, periods=365):
+
+@st.cache_data(ttl=3600)
+def _fetch_history(ticker):
+    """Cached 5y price history so reruns don't re-download from Yahoo"""
+    data = yf.download(ticker, period="5y")
+    # yf.download reports failures by returning an empty frame; raise so
+    # that a transient error is not cached for the whole TTL
+    if data.empty:
+        raise ValueError(f"No price history downloaded for {ticker}")
+    return data
+
+
+def _with_script_ctx(func):
+    """Wrap func so it runs with the calling thread's ScriptRunContext, letting
+    st.cache_data inside worker threads run without missing-context warnings"""
+    ctx = get_script_run_ctx()
+
+    def run(*args):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args)
+    return run
+
+
+async def to_thread_with_ctx(func, *args):
+    """asyncio.to_thread with the caller's ScriptRunContext attached"""
+    return await asyncio.to_thread(_with_script_ctx(func), *args)
+
+
+async def get_history_async(ticker):
+    """Run the cached history download in a worker thread"""
+    return await to_thread_with_ctx(_fetch_history, ticker)
+
+
+def fetch_histories(tickers):
+    """Download several tickers' histories concurrently, keyed by ticker.
+    A failed download is reported and comes back as an empty DataFrame."""
+    async def gather():
+        return await asyncio.gather(*(get_history_async(t) for t in tickers),
+                                    return_exceptions=True)
+
+    histories = {}
+    for ticker, data in zip(tickers, asyncio.run(gather())):
+        if isinstance(data, Exception):
+            print(f"Prediction error: {data}")
+            data = pd.DataFrame()
+        histories[ticker] = data
+    return histories
+
+
+def get_forecast(ticker, periods=365, freq="W"):
+    """Slim forecast: ds plus float32 yhat, skipping uncertainty sampling"""
+    return _get_forecast(ticker, periods, freq, bands=False)
+
+
+def get_forecast_with_bands(ticker, periods=365, freq="W"):
+    """Forecast with the yhat_lower/yhat_upper uncertainty interval"""
+    return _get_forecast(ticker, periods, freq, bands=True)
+
+
+def _get_forecast(ticker, periods, freq, bands):
     try:
         # Download historical data
-        data = yf.download(ticker, period="5y")
+        data = _fetch_history(ticker)
+    except Exception as e:
+        print(f"Prediction error: {e}")
+        return pd.DataFrame()
+    return _forecast_history(ticker, data, periods, freq, bands)
+
+
+@st.cache_data(max_entries=FITTED_MODEL_CACHE_SIZE, show_spinner=False)
+def _fit_prophet(ticker, data_fingerprint, freq, _df):
+    """Fit Prophet once per (ticker, data snapshot) and cache it as JSON in
+    memory, so repeat forecasts skip straight to predict(). Not persisted:
+    the fingerprint changes with every history refresh and Streamlit never
+    prunes persist="disk" entries, so disk use would grow without bound."""
+    # Prophet (and cmdstanpy) is imported here rather than at module level
+    # so that importing predict for history fetching stays cheap
+    from prophet import Prophet
+    from prophet.serialize import model_to_json
+
+    # Train model: closes only need trend + yearly seasonality, and a
+    # smaller posterior sample is plenty for the yhat_lower/upper bands
+    model = Prophet(daily_seasonality=False,
+                    weekly_seasonality=False,
+                    yearly_seasonality=True,
+                    n_changepoints=10,
+                    changepoint_range=0.9,
+                    uncertainty_samples=100)
+    model.fit(_df)
+    return model_to_json(model)
+
+
+def _forecast_history(ticker, data, periods=365, freq="W", bands=False):
+    """Fit Prophet on downloaded price history and predict `periods` days
+    ahead. freq="W" trains on weekly (Friday) closes, "D" on daily closes."""
+    try:
+        from prophet.serialize import model_from_json
+
         df = data.reset_index()[['Date', 'Close']]
         df.columns = ['ds', 'y']
+        if freq == "W":
+            # ~5x fewer rows to fit; long-horizon trend/seasonality is unaffected
+            df = df.set_index('ds').resample(WEEKLY_FREQ).last().dropna().reset_index()
 
-        # Train model
-        model = Prophet()
-        model.fit(df)
+        # Train model (reused while the latest close is unchanged)
+        fingerprint = f"{df['ds'].iloc[-1]}|{len(df)}|{df['y'].iloc[-1]}"
+        model = model_from_json(_fit_prophet(ticker, fingerprint, freq, df))
+        if not bands:
+            model.uncertainty_samples = 0  # predict() then skips posterior sampling
 
         # Generate forecast
-        future = model.make_future_dataframe(periods=periods)
+        if freq == "W":
+            future = model.make_future_dataframe(periods=-(-periods // 7),
+                                                 freq=WEEKLY_FREQ)
+        else:
+            future = model.make_future_dataframe(periods=periods)
         forecast = model.predict(future)
-        return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+        if bands:
+            return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+
+        out = forecast[['ds', 'yhat']].copy()
+        out['yhat'] = out['yhat'].astype(np.float32)
+        return out
 
     except Exception as e:
         print(f"Prediction error: {e}")
         return pd.DataFrame()
+
+
+def forecast_many(tickers, periods=365, freq="W"):
+    """Forecast several tickers: histories download concurrently, then the
+    Prophet fits run in a thread pool. CmdStan fits each model in its own
+    subprocess, so threads overlap the fits without process start-up cost."""
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return {}
+    histories = fetch_histories(tickers)
+    forecast = _with_script_ctx(_forecast_history)
+    with ThreadPoolExecutor(min(len(tickers), os.cpu_count() or 1)) as pool:
+        forecasts = pool.map(forecast, tickers, [histories[t] for t in tickers],
+                             [periods] * len(tickers), [freq] * len(tickers))
+        return dict(zip(tickers, forecasts))